@@ -1,97 +1,89 @@
 import os
 import json
+import math
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 from google import genai
 from dotenv import load_dotenv
+from pydantic import BaseModel
 from backend.models import Meal, User, MealSelection, Recommendation, Menu, SAMPLE_MEALS
 from backend.calculations import calculate_daily_calories, get_macro_targets
 
 # Load environment variables
 load_dotenv()
 
-def get_meal_recommendation(user: User, selection: MealSelection) -> Recommendation:
-    """AI-powered meal recommendations using Gemini"""
-    
-    daily_calories = calculate_daily_calories(user)
-    macro_targets = get_macro_targets(user, daily_calories)
+logger = logging.getLogger(__name__)
 
-    # Calculate current totals - always use gram-based approach
-    current_calories = 0
-    current_protein = 0
-    current_carbs = 0
-    current_fat = 0
-    current_fiber = 0
-    current_cost = 0
+# Resolved once; without a key the AI endpoints fall back to their non-AI answers
+_GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+if not _GEMINI_API_KEY:
+    logger.warning("GEMINI_API_KEY not set; AI recommendations will use fallbacks")
 
-    meal_descriptions = []
+# SAMPLE_MEALS is static, so the name index and the menu prompt catalog are built once
+_SAMPLE_INDEX = {meal.name.lower(): meal for meal in SAMPLE_MEALS}
 
-    for i, (meal, qty) in enumerate(zip(selection.meals, selection.quantities)):
-        print(f"DEBUG: Meal {i}: {meal.name}, qty: {qty}, type: {type(qty)}")
-        print(f"DEBUG: Meal calories: {meal.calories}, type: {type(meal.calories)}")
-
-        # Always use gram-based calculation (qty is in grams)
-        # Use first cooking method nutrition values if available, otherwise use base values
-        if hasattr(meal, 'cooking_methods') and meal.cooking_methods:
-            # Use first cooking method nutrition per 100g
-            method_data = meal.cooking_methods[0]
-            calories_per_100g = method_data["calories"]
-            protein_per_100g = method_data["protein"]
-            carbs_per_100g = method_data["carbs"]
-            fat_per_100g = method_data["fat"]
-            fiber_per_100g = method_data.get("fiber", 0)
-            method_name = method_data['method']
-        else:
-            # Use base meal nutrition per 100g
-            calories_per_100g = float(meal.calories)
-            protein_per_100g = float(meal.protein)
-            carbs_per_100g = float(meal.carbs)
-            fat_per_100g = float(meal.fat)
-            fiber_per_100g = float(getattr(meal, 'fiber', 0))
-            method_name = "cơ bản"
-        
-        # Calculate nutrition and cost based on grams
-        current_calories += (calories_per_100g * float(qty) / 100)
-        current_protein += (protein_per_100g * float(qty) / 100)
-        current_carbs += (carbs_per_100g * float(qty) / 100)
-        current_fat += (fat_per_100g * float(qty) / 100)
-        current_fiber += (fiber_per_100g * float(qty) / 100)
-        current_cost += (float(meal.price) * float(qty) / 100)  # Price per 100g
-        meal_descriptions.append(f"{meal.name} ({method_name}, {qty}g)")
-
-    print(f"DEBUG: Current totals calculated: {current_calories}, {current_protein}, {current_carbs}, {current_fat}, {current_fiber}")
-
-    prompt = f"""
+_CATALOG_METHOD_FIELDS = ("method", "calories", "protein", "carbs", "fat", "fiber", "price")
+
+def _catalog_line(meal: Meal) -> str:
+    # One compact JSON object per meal; method rows follow the legend in _MENU_PROMPT
+    return json.dumps({
+        "name": meal.name,
+        "methods": [[method[field] for field in _CATALOG_METHOD_FIELDS] for method in meal.cooking_methods],
+    }, ensure_ascii=False, separators=(",", ":"))
+
+def _min_portion_cost(meal: Meal) -> float:
+    # Cost of the smallest allowed portion (25g) of the cheapest way to serve the meal
+    prices = [method["price"] for method in meal.cooking_methods] or [meal.price]
+    return min(prices) * 25 / 100
+
+_SAMPLE_MEAL_LINES = [(_min_portion_cost(meal), _catalog_line(meal)) for meal in SAMPLE_MEALS]
+_SAMPLE_MEALS_PROMPT = "\n".join(line for _, line in _SAMPLE_MEAL_LINES)
+_MAX_MIN_PORTION_COST = max(cost for cost, _ in _SAMPLE_MEAL_LINES)
+
+def _catalog_for_budget(budget: float) -> str:
+    """Menu catalog limited to meals whose smallest portion fits in the budget"""
+    if budget >= _MAX_MIN_PORTION_COST:
+        return _SAMPLE_MEALS_PROMPT
+    return "\n".join(line for cost, line in _SAMPLE_MEAL_LINES if cost <= budget)
+
+# Prompt templates are module constants filled per request with str.format_map.
+# Numbers are rendered as whole grams/calories/VND: decimals only cost tokens here.
+_RECOMMENDATION_PROMPT = """
     Bạn là một chuyên gia dinh dưỡng AI chuyên nghiệp. Hãy phân tích kế hoạch bữa ăn hiện tại và đề xuất điều chỉnh khẩu phần để phù hợp với mục tiêu và nhu cầu dinh dưỡng của người dùng.
 
     Hồ sơ người dùng:
-    - Tuổi: {user.age}, Giới tính: {user.gender}
-    - Chiều cao: {user.height}cm, Cân nặng: {user.weight}kg
-    - Mức độ vận động: {user.activity}, Mục tiêu: {user.goal}
+    - Tuổi: {age}, Giới tính: {gender}
+    - Chiều cao: {height:g}cm, Cân nặng: {weight:g}kg
+    - Mức độ vận động: {activity}, Mục tiêu: {goal}
     - Calo mục tiêu hàng ngày: {daily_calories:.0f}
-    - Protein mục tiêu: {macro_targets['protein']:.1f}g
-    - Carb mục tiêu: {macro_targets['carbs']:.1f}g
-    - Chất béo mục tiêu: {macro_targets['fat']:.1f}g
-    - Chất xơ mục tiêu: {macro_targets['fiber']:.1f}g
+    - Protein mục tiêu: {protein_target:.0f}g
+    - Carb mục tiêu: {carbs_target:.0f}g
+    - Chất béo mục tiêu: {fat_target:.0f}g
+    - Chất xơ mục tiêu: {fiber_target:.0f}g
 
     Kế hoạch bữa ăn hiện tại:
-    {', '.join(meal_descriptions)}
+    {meal_descriptions}
 
     Tổng dinh dưỡng hiện tại:
-    - Calo: {current_calories:.1f} (mục tiêu: {daily_calories:.0f})
-    - Protein: {current_protein:.1f}g (mục tiêu: {macro_targets['protein']:.1f}g)
-    - Carb: {current_carbs:.1f}g (mục tiêu: {macro_targets['carbs']:.1f}g)
-    - Chất béo: {current_fat:.1f}g (mục tiêu: {macro_targets['fat']:.1f}g)
-    - Chất xơ: {current_fiber:.1f}g (mục tiêu: {macro_targets['fiber']:.1f}g)
+    - Calo: {current_calories:.0f} (mục tiêu: {daily_calories:.0f})
+    - Protein: {current_protein:.0f}g (mục tiêu: {protein_target:.0f}g)
+    - Carb: {current_carbs:.0f}g (mục tiêu: {carbs_target:.0f}g)
+    - Chất béo: {current_fat:.0f}g (mục tiêu: {fat_target:.0f}g)
+    - Chất xơ: {current_fiber:.0f}g (mục tiêu: {fiber_target:.0f}g)
 
     Lưu ý:
     - Có 4 calo trên mỗi gram protein và carb, 9 calo trên mỗi gram fat, 2 calo trên mỗi gram fiber.
 
-    Hãy phân tích kế hoạch bữa ăn hiện tại và đề xuất điều chỉnh khẩu phần để phù hợp hơn với mục tiêu {user.goal} và các chỉ số dinh dưỡng của người dùng:
+    Hãy phân tích kế hoạch bữa ăn hiện tại và đề xuất điều chỉnh khẩu phần để phù hợp hơn với mục tiêu {goal} và các chỉ số dinh dưỡng của người dùng:
     - Nếu mục tiêu người dùng là "lose", hãy ưu tiên giảm tổng calo thấp hơn calo hằng ngày và đảm bảo đủ protein.
     - Nếu mục tiêu người dùng là "gain", hãy ưu tiên tăng tổng calo cao hơn calo hằng ngày và tăng cường protein.
     - Nếu mục tiêu người dùng là "maintain", hãy giữ calo ổn định và cân bằng các chất dinh dưỡng.
     
     HƯỚNG DẪN QUAN TRỌNG:
-    1. Luôn cung cấp chính xác {len(selection.quantities)} lượng điều chỉnh (một cho mỗi món ăn)
+    1. Luôn cung cấp chính xác {meal_count} lượng điều chỉnh (một cho mỗi món ăn)
     2. TẤT CẢ món ăn đều tính theo GRAM, điều chỉnh từ 25-400 gram
     3. MỖI lượng gram phải chia hết cho 25 (ví dụ: 25g, 50g, 75g, 100g, 125g, 150g...)
     4. Thực hiện điều chỉnh có ý nghĩa (ít nhất 25g thay đổi) khi dinh dưỡng lệch khá nhiều so với mục tiêu
@@ -99,112 +91,220 @@ def get_meal_recommendation(user: User, selection: MealSelection) -> Recommendat
     6. Giá trị dinh dưỡng của mỗi món ăn được tính theo cal/100g
     
     Tập trung vào:
-    - Cân bằng calo cho mục tiêu {user.goal}
+    - Cân bằng calo cho mục tiêu {goal}
     - Đủ protein (đặc biệt quan trọng cho mục tiêu cơ bắp)
     - Phân bố cân bằng các chất dinh dưỡng macro
     - Khẩu phần thực tế (25g là bước nhỏ nhất)
     
     Vui lòng trả về bằng tiếng Việt và chỉ trả về JSON hợp lệ với:
     {{
-        "adjusted_grams": [danh sách {len(selection.quantities)} giá trị gram (phải chia hết cho 25)],
+        "adjusted_grams": [danh sách {meal_count} giá trị gram (phải chia hết cho 25)],
         "explanation": "Giải thích rõ ràng về lý do điều chỉnh dựa trên thiếu hụt dinh dưỡng và mục tiêu của người dùng"
     }}
     """
 
-    print("DEBUG: About to call Gemini API")
-    try:
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
+_MENU_PROMPT = """
+    Hồ sơ người dùng:
+    - Tuổi: {age}, Giới tính: {gender}, Mục tiêu: {goal}
+    - Calo mục tiêu hàng ngày: {daily_calories:.0f}
+    - Protein mục tiêu: {protein_target:.0f}g
+    - Carb mục tiêu: {carbs_target:.0f}g
+    - Chất béo mục tiêu: {fat_target:.0f}g
+    - Ngân sách hàng ngày: {budget:.0f} VND
+
+    Các món ăn có sẵn (mỗi phương pháp nấu: [phương_pháp, calo, protein g, carb g, chất béo g, chất xơ g, giá VND], tính trên 100g):
+    {meals}
+
+    Tạo thực đơn tối ưu cho cả ngày (sáng, trưa, tối) sao cho:
+    1. Nằm trong ngân sách: {budget:.0f} VND
+    2. Đạt mục tiêu calo hằng ngày: ~{daily_calories:.0f}
+    3. Phù hợp với các chỉ số dinh dưỡng dựa trên mục tiêu ({goal}):
+    - Nếu mục tiêu người dùng là "lose", hãy ưu tiên giảm tổng calo thấp hơn calo hằng ngày và đảm bảo đủ protein.
+    - Nếu mục tiêu người dùng là "gain", hãy ưu tiên tăng tổng calo cao hơn calo hằng ngày và tăng cường protein.
+    - Nếu mục tiêu người dùng là "maintain", hãy giữ calo ổn định và cân bằng các chất dinh dưỡng.
+    4. Chỉ sử dụng phương pháp nấu và khối lượng tính bằng gram (PHẢI chia hết cho 25g, tối thiểu 25g)
+    5. Chỉ chọn từ danh sách món ăn có sẵn ở trên
+
+    HƯỚNG DẪN TÍNH GIÁ:
+    - Tất cả giá trên được tính theo VND/100g
+    - Để tính giá cho số gram cụ thể: (giá/100g) × (số gram) / 100
+    - Ví dụ: Ức gà nướng 200g = (60000 VND/100g) × 200g / 100 = 120,000 VND
+    - Hãy tính toán cẩn thận để đảm bảo tổng chi phí không vượt quá ngân sách {budget:.0f} VND
+
+    Vui lòng trả về bằng tiếng Việt với định dạng JSON:
+    {{
+        "breakfast": [
+            {{"name": "tên_món_ăn", "method": "phương_pháp_nấu", "grams": 100, "calories": 100, "protein": 10, "carbs": 20, "fat": 5, "fiber": 3}}
+        ],
+        "lunch": [...],
+        "dinner": [...],
+        "explanation": "Thực đơn được thiết kế cho mục tiêu giảm cân với protein cao..."
+    }}
+    """
+
+# Gemini client shared across requests so its HTTP connection pool is reused
+_CLIENT: Optional[genai.Client] = None
+
+_RECOMMENDATION_MODEL = "gemini-2.0-flash"
+_MENU_MODEL = "gemini-1.5-flash"
+
+# Reply shapes enforced by Gemini structured output, so replies carry exactly the keys parsed below
+class _RecommendationReply(BaseModel):
+    adjusted_grams: List[float]
+    explanation: str
+
+class _MenuItemReply(BaseModel):
+    name: str
+    method: str
+    grams: float
+    calories: float
+    protein: float
+    carbs: float
+    fat: float
+    fiber: float
+
+class _MenuReply(BaseModel):
+    breakfast: List[_MenuItemReply]
+    lunch: List[_MenuItemReply]
+    dinner: List[_MenuItemReply]
+    explanation: str
+
+_RECOMMENDATION_CONFIG = {"response_mime_type": "application/json", "response_schema": _RecommendationReply}
+_MENU_CONFIG = {"response_mime_type": "application/json", "response_schema": _MenuReply}
+
+def _get_client() -> genai.Client:
+    """Return the shared Gemini client, creating it on first use"""
+    global _CLIENT
+    if _CLIENT is None:
+        if not _GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
+        _CLIENT = genai.Client(api_key=_GEMINI_API_KEY)
+    return _CLIENT
+
+def _nutrition_matrix(meals: List[Meal]) -> List[Tuple[float, ...]]:
+    """Per-100g (calories, protein, carbs, fat, fiber, price) rows, one per meal"""
+    return [meal.nutrition_per_100g for meal in meals]
+
+def _aggregate_nutrition(rows: List[Tuple[float, ...]], quantities: List[float]) -> List[float]:
+    """Sum per-100g rows scaled by gram quantities into six totals"""
+    totals = [0.0] * 6
+    for row, qty in zip(rows, quantities):
+        scale = float(qty) / 100
+        for j, value in enumerate(row):
+            totals[j] += value * scale
+    return totals
+
+# Gemini replies keyed by a digest of (model, prompt). The prompt already carries every input
+# the model sees, so equal prompts can share a reply; only replies that parsed are stored.
+_RESPONSE_CACHE_SIZE = 1024
+_response_cache: "OrderedDict[bytes, str]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+def _cache_key(model: str, prompt: str) -> bytes:
+    return hashlib.blake2b(f"{model}\n{prompt}".encode(), digest_size=16).digest()
+
+def _cache_get(key: bytes) -> Optional[str]:
+    """Return the cached reply for key, marking it most recently used"""
+    with _response_cache_lock:
+        response_text = _response_cache.get(key)
+        if response_text is not None:
+            _response_cache.move_to_end(key)
+        return response_text
+
+def _cache_put(key: bytes, response_text: str) -> None:
+    """Store a reply, evicting the least recently used one when full"""
+    with _response_cache_lock:
+        _response_cache[key] = response_text
+        _response_cache.move_to_end(key)
+        if len(_response_cache) > _RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+def _snap25(grams: List[float]) -> List[float]:
+    """Round gram amounts to the nearest 25g increment, with a 25g minimum"""
+    return [float(max(25, round(float(g) / 25) * 25)) for g in grams]
+
+def _prepare_recommendation(user: User, selection: MealSelection) -> Tuple[str, List[Tuple[float, ...]], float, float]:
+    """Compute targets and current totals and build the recommendation prompt"""
+    
+    daily_calories = calculate_daily_calories(user)
+    macro_targets = get_macro_targets(user, daily_calories)
 
-        client = genai.Client(api_key=api_key)
-        
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-            config={"response_mime_type": "application/json"}
-        )
+    # Per-100g nutrition is extracted once and reused for the post-AI recalculation
+    nutrition = _nutrition_matrix(selection.meals)
+    (current_calories, current_protein, current_carbs,
+     current_fat, current_fiber, current_cost) = _aggregate_nutrition(nutrition, selection.quantities)
 
-        print(f"DEBUG: Gemini API response received: {response.text[:200]}...")
+    meal_descriptions = []
+
+    for meal, qty in zip(selection.meals, selection.quantities):
+        if meal.cooking_methods:
+            method_name = meal.cooking_methods[0]['method']
+        else:
+            method_name = "cơ bản"
+        meal_descriptions.append(f"{meal.name} ({method_name}, {qty:g}g)")
+
+    logger.debug("Current totals calculated: %s, %s, %s, %s, %s",
+                 current_calories, current_protein, current_carbs, current_fat, current_fiber)
+
+    prompt = _RECOMMENDATION_PROMPT.format_map({
+        "age": user.age,
+        "gender": user.gender.value,
+        "height": user.height,
+        "weight": user.weight,
+        "activity": user.activity.value,
+        "goal": user.goal.value,
+        "daily_calories": daily_calories,
+        "protein_target": macro_targets['protein'],
+        "carbs_target": macro_targets['carbs'],
+        "fat_target": macro_targets['fat'],
+        "fiber_target": macro_targets['fiber'],
+        "meal_descriptions": ', '.join(meal_descriptions),
+        "meal_count": len(selection.quantities),
+        "current_calories": current_calories,
+        "current_protein": current_protein,
+        "current_carbs": current_carbs,
+        "current_fat": current_fat,
+        "current_fiber": current_fiber,
+    })
+
+    return prompt, nutrition, daily_calories, current_calories
+
+def _recommendation_from_response(selection: MealSelection, nutrition: List[Tuple[float, ...]],
+                                  daily_calories: float, current_calories: float,
+                                  response_text: Optional[str], cache_key: bytes) -> Recommendation:
+    """Turn Gemini's reply (None if the call failed) into a Recommendation"""
+    if response_text is not None:
+        logger.debug("Gemini API response received: %.200s...", response_text)
 
         # Parse the JSON response
         try:
-            result = json.loads(response.text)
-            print(f"DEBUG: Parsed result: {result}")
+            result = json.loads(response_text)
+            logger.debug("Parsed result: %s", result)
             # Get gram values and ensure they are multiples of 25
             raw_grams = result.get("adjusted_grams", result.get("adjusted_quantities", selection.quantities))
-            adjusted_quantities = []
-            for gram_qty in raw_grams:
-                # Round to nearest 25g increment
-                rounded_grams = round(float(gram_qty) / 25) * 25
-                # Ensure minimum 25g
-                rounded_grams = max(25, rounded_grams)
-                adjusted_quantities.append(float(rounded_grams))
+            adjusted_quantities = _snap25(raw_grams)
             explanation = result.get("explanation", "AI recommendation generated")
+            _cache_put(cache_key, response_text)
         except Exception as e:
-            print(f"Error parsing AI response: {e}")
+            logger.warning("Error parsing AI response: %s", e)
             # Fallback if JSON parsing fails - round current quantities to 25g increments
-            adjusted_quantities = []
-            for qty in selection.quantities:
-                rounded_grams = round(float(qty) / 25) * 25
-                rounded_grams = max(25, rounded_grams)
-                adjusted_quantities.append(float(rounded_grams))
+            adjusted_quantities = _snap25(selection.quantities)
             explanation = "Unable to parse AI response - using rounded current quantities"
-
-    except Exception as e:
-        print(f"Error calling AI service: {e}")
+    else:
         # Fallback: simple scaling based on calorie target with 25g rounding
         scale_factor = daily_calories / max(current_calories, 1)
-        adjusted_quantities = []
-        for qty in selection.quantities:
-            scaled_qty = qty * scale_factor
-            # Round to nearest 25g increment
-            rounded_grams = round(scaled_qty / 25) * 25
-            rounded_grams = max(25, rounded_grams)
-            adjusted_quantities.append(float(rounded_grams))
+        adjusted_quantities = _snap25([qty * scale_factor for qty in selection.quantities])
         explanation = f"Simple scaling: {scale_factor:.2f}x to reach {daily_calories} calories (rounded to 25g increments)"
 
     # Recalculate with adjusted quantities
-    print(f"DEBUG: About to recalculate with adjusted_quantities: {adjusted_quantities}")
-    print(f"DEBUG: Meals: {[meal.name for meal in selection.meals]}")
-    
-    total_calories = 0
-    total_protein = 0
-    total_carbs = 0
-    total_fat = 0
-    total_fiber = 0
-    total_cost = 0
-
-    for meal, qty in zip(selection.meals, adjusted_quantities):
-        # Always use gram-based calculation (qty is in grams)
-        # Use first cooking method nutrition values if available, otherwise use base values
-        if hasattr(meal, 'cooking_methods') and meal.cooking_methods:
-            # Use first cooking method nutrition per 100g
-            method_data = meal.cooking_methods[0]
-            calories_per_100g = method_data["calories"]
-            protein_per_100g = method_data["protein"]
-            carbs_per_100g = method_data["carbs"]
-            fat_per_100g = method_data["fat"]
-            fiber_per_100g = method_data.get("fiber", 0)
-        else:
-            # Use base meal nutrition per 100g
-            calories_per_100g = float(meal.calories)
-            protein_per_100g = float(meal.protein)
-            carbs_per_100g = float(meal.carbs)
-            fat_per_100g = float(meal.fat)
-            fiber_per_100g = float(getattr(meal, 'fiber', 0))
-        
-        # Calculate nutrition and cost based on grams
-        total_calories += (calories_per_100g * float(qty) / 100)
-        total_protein += (protein_per_100g * float(qty) / 100)
-        total_carbs += (carbs_per_100g * float(qty) / 100)
-        total_fat += (fat_per_100g * float(qty) / 100)
-        total_fiber += (fiber_per_100g * float(qty) / 100)
-        total_cost += (float(meal.price) * float(qty) / 100)  # Price per 100g
+    (total_calories, total_protein, total_carbs,
+     total_fat, total_fiber, total_cost) = _aggregate_nutrition(nutrition, adjusted_quantities)
 
-    print(f"DEBUG: Final totals: {total_calories}, {total_protein}, {total_carbs}, {total_fat}, {total_fiber}, {total_cost}")
+    logger.debug("Final totals: %s, %s, %s, %s, %s, %s",
+                 total_calories, total_protein, total_carbs, total_fat, total_fiber, total_cost)
 
-    return Recommendation(
+    # Inputs are already-validated meals and computed floats, so skip re-validation
+    return Recommendation.model_construct(
         adjusted_meals=selection.meals,
         adjusted_quantities=adjusted_quantities,
         total_calories=total_calories,
@@ -216,135 +316,179 @@ def get_meal_recommendation(user: User, selection: MealSelection) -> Recommendat
         explanation=explanation
     )
 
-def get_optimized_menu(user: User, budget: float) -> Menu:
-    """Use Gemini to create an optimized menu within budget"""
+def get_meal_recommendation(user: User, selection: MealSelection) -> Recommendation:
+    """AI-powered meal recommendations using Gemini"""
+    prompt, nutrition, daily_calories, current_calories = _prepare_recommendation(user, selection)
+    cache_key = _cache_key(_RECOMMENDATION_MODEL, prompt)
 
-    daily_calories = calculate_daily_calories(user)
-    macro_targets = get_macro_targets(user, daily_calories)
+    response_text = _cache_get(cache_key)
+    if response_text is None:
+        logger.debug("About to call Gemini API")
+        try:
+            response = _get_client().models.generate_content(
+                model=_RECOMMENDATION_MODEL,
+                contents=prompt,
+                config=_RECOMMENDATION_CONFIG
+            )
+            response_text = response.text
+        except Exception as e:
+            logger.warning("Error calling AI service: %s", e)
 
-    meals_str = "\n".join([
-        f"- {meal.name} " +
-        (f"\n  Cooking methods: " + 
-         ", ".join([f"{method['method']} ({method['calories']} cal, {method['protein']}g protein, {method['carbs']}g carbs, {method['fat']}g fat, {method['fiber']}g fiber, {method['price']} VND/100g)" 
-                   for method in meal.cooking_methods]) 
-         if hasattr(meal, 'cooking_methods') and meal.cooking_methods else "")
-        for meal in SAMPLE_MEALS
-    ])
+    return _recommendation_from_response(selection, nutrition, daily_calories, current_calories,
+                                         response_text, cache_key)
 
-    prompt = f"""
-    Hồ sơ người dùng:
-    - Tuổi: {user.age}, Giới tính: {user.gender}, Mục tiêu: {user.goal}
-    - Calo mục tiêu hàng ngày: {daily_calories}
-    - Protein mục tiêu: {macro_targets['protein']:.1f}g
-    - Carb mục tiêu: {macro_targets['carbs']:.1f}g
-    - Chất béo mục tiêu: {macro_targets['fat']:.1f}g
-    - Ngân sách hàng ngày: {budget} VND
+async def aget_meal_recommendation(user: User, selection: MealSelection) -> Recommendation:
+    """Async variant of get_meal_recommendation that awaits Gemini without blocking the event loop"""
+    prompt, nutrition, daily_calories, current_calories = _prepare_recommendation(user, selection)
+    cache_key = _cache_key(_RECOMMENDATION_MODEL, prompt)
 
-    Các món ăn có sẵn:
-    {meals_str}
+    response_text = _cache_get(cache_key)
+    if response_text is None:
+        logger.debug("About to call Gemini API")
+        try:
+            response = await _get_client().aio.models.generate_content(
+                model=_RECOMMENDATION_MODEL,
+                contents=prompt,
+                config=_RECOMMENDATION_CONFIG
+            )
+            response_text = response.text
+        except Exception as e:
+            logger.warning("Error calling AI service: %s", e)
 
-    Tạo thực đơn tối ưu cho cả ngày (sáng, trưa, tối) sao cho:
-    1. Nằm trong ngân sách: {budget} VND
-    2. Đạt mục tiêu calo hằng ngày: ~{daily_calories}
-    3. Phù hợp với các chỉ số dinh dưỡng dựa trên mục tiêu ({user.goal}):
-    - Nếu mục tiêu người dùng là "lose", hãy ưu tiên giảm tổng calo thấp hơn calo hằng ngày và đảm bảo đủ protein.
-    - Nếu mục tiêu người dùng là "gain", hãy ưu tiên tăng tổng calo cao hơn calo hằng ngày và tăng cường protein.
-    - Nếu mục tiêu người dùng là "maintain", hãy giữ calo ổn định và cân bằng các chất dinh dưỡng.
-    4. Chỉ sử dụng phương pháp nấu và khối lượng tính bằng gram (PHẢI chia hết cho 25g, tối thiểu 25g)
-    5. Chỉ chọn từ danh sách món ăn có sẵn ở trên
+    return _recommendation_from_response(selection, nutrition, daily_calories, current_calories,
+                                         response_text, cache_key)
 
-    HƯỚNG DẪN TÍNH GIÁ:
-    - Tất cả giá trên được tính theo VND/100g
-    - Để tính giá cho số gram cụ thể: (giá/100g) × (số gram) / 100
-    - Ví dụ: Ức gà nướng 200g = (60000 VND/100g) × 200g / 100 = 120,000 VND
-    - Hãy tính toán cẩn thận để đảm bảo tổng chi phí không vượt quá ngân sách {budget} VND
+def _budget_bucket(budget: float) -> float:
+    """Round a budget down to two significant figures (e.g. 123,456 -> 120,000 VND)"""
+    if budget <= 0:
+        return budget
+    step = 10 ** max(int(math.log10(budget)) - 1, 0)
+    return budget // step * step
 
-    Vui lòng trả về bằng tiếng Việt với định dạng JSON:
-    {{
-        "breakfast": [
-            {{"name": "tên_món_ăn", "method": "phương_pháp_nấu", "grams": 100, "calories": 100, "protein": 10, "carbs": 20, "fat": 5, "fiber": 3}}
-        ],
-        "lunch": [...],
-        "dinner": [...],
-        "explanation": "Thực đơn được thiết kế cho mục tiêu giảm cân với protein cao..."
-    }}
-    """
+def _prepare_menu(user: User, budget: float) -> Tuple[str, float]:
+    """Compute the calorie target and build the budget menu prompt"""
 
-    try:
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
+    daily_calories = calculate_daily_calories(user)
+    macro_targets = get_macro_targets(user, daily_calories)
 
-        client = genai.Client(api_key=api_key)
-        
-        response = client.models.generate_content(
-            model="gemini-1.5-flash",
-            contents=prompt,
-            config={"response_mime_type": "application/json"}
-        )
-
-        result = json.loads(response.text)
-        print(f"DEBUG: parsed result: {result}")
-        
-        # Convert to Menu object
-        breakfast_meals = []
-        lunch_meals = []
-        dinner_meals = []
-        
-        # Create meal objects from the AI response
-        for meal_data in result.get("breakfast", []):
-            breakfast_meals.append(create_meal_from_response(meal_data))
+    # Nearby budgets share a prompt, and so a cached reply; rounding down keeps the menu affordable
+    budget = _budget_bucket(budget)
+
+    prompt = _MENU_PROMPT.format_map({
+        "age": user.age,
+        "gender": user.gender.value,
+        "goal": user.goal.value,
+        "daily_calories": daily_calories,
+        "protein_target": macro_targets['protein'],
+        "carbs_target": macro_targets['carbs'],
+        "fat_target": macro_targets['fat'],
+        "budget": budget,
+        "meals": _catalog_for_budget(budget),
+    })
+
+    return prompt, daily_calories
+
+def _menu_from_response(response_text: str) -> Menu:
+    """Turn Gemini's JSON menu into a Menu with prices and nutrition recomputed from SAMPLE_MEALS"""
+    result = json.loads(response_text)
+    logger.debug("Parsed menu result: %s", result)
+    
+    # Convert to Menu object
+    breakfast_meals = []
+    lunch_meals = []
+    dinner_meals = []
+    
+    # Create meal objects from the AI response
+    for meal_data in result.get("breakfast", []):
+        breakfast_meals.append(create_meal_from_response(meal_data))
+    
+    for meal_data in result.get("lunch", []):
+        lunch_meals.append(create_meal_from_response(meal_data))
         
-        for meal_data in result.get("lunch", []):
-            lunch_meals.append(create_meal_from_response(meal_data))
-            
-        for meal_data in result.get("dinner", []):
-            dinner_meals.append(create_meal_from_response(meal_data))
-
-        # Recalculate totals based on corrected meal data
-        all_meals = breakfast_meals + lunch_meals + dinner_meals
-        corrected_total_cost = sum(meal.price for meal in all_meals)
-        corrected_total_calories = sum(meal.calories for meal in all_meals)
-
-        return Menu(
-            breakfast=breakfast_meals,
-            lunch=lunch_meals,
-            dinner=dinner_meals,
-            total_cost=corrected_total_cost,
-            total_calories=corrected_total_calories,
-            explanation=result.get("explanation", "AI-generated optimized menu")
-        )
+    for meal_data in result.get("dinner", []):
+        dinner_meals.append(create_meal_from_response(meal_data))
+
+    # Recalculate totals based on corrected meal data
+    all_meals = breakfast_meals + lunch_meals + dinner_meals
+    corrected_total_cost = sum(meal.price for meal in all_meals)
+    corrected_total_calories = sum(meal.calories for meal in all_meals)
+
+    return Menu.model_construct(
+        breakfast=breakfast_meals,
+        lunch=lunch_meals,
+        dinner=dinner_meals,
+        total_cost=corrected_total_cost,
+        total_calories=corrected_total_calories,
+        explanation=result.get("explanation", "AI-generated optimized menu")
+    )
+
+def get_optimized_menu(user: User, budget: float) -> Menu:
+    """Use Gemini to create an optimized menu within budget"""
+    prompt, daily_calories = _prepare_menu(user, budget)
+    cache_key = _cache_key(_MENU_MODEL, prompt)
+
+    try:
+        response_text = _cache_get(cache_key)
+        if response_text is None:
+            response = _get_client().models.generate_content(
+                model=_MENU_MODEL,
+                contents=prompt,
+                config=_MENU_CONFIG
+            )
+            response_text = response.text
+        menu = _menu_from_response(response_text)
+    except Exception as e:
+        logger.warning("Error creating optimized menu: %s", e)
+        # Fallback: create a simple balanced menu
+        return create_fallback_menu(user, budget, daily_calories)
 
+    _cache_put(cache_key, response_text)
+    return menu
+
+async def aget_optimized_menu(user: User, budget: float) -> Menu:
+    """Async variant of get_optimized_menu that awaits Gemini without blocking the event loop"""
+    prompt, daily_calories = _prepare_menu(user, budget)
+    cache_key = _cache_key(_MENU_MODEL, prompt)
+
+    try:
+        response_text = _cache_get(cache_key)
+        if response_text is None:
+            response = await _get_client().aio.models.generate_content(
+                model=_MENU_MODEL,
+                contents=prompt,
+                config=_MENU_CONFIG
+            )
+            response_text = response.text
+        menu = _menu_from_response(response_text)
     except Exception as e:
-        print(f"Error creating optimized menu: {e}")
+        logger.warning("Error creating optimized menu: %s", e)
         # Fallback: create a simple balanced menu
         return create_fallback_menu(user, budget, daily_calories)
 
-def create_meal_from_response(meal_data: dict):
+    _cache_put(cache_key, response_text)
+    return menu
+
+def create_meal_from_response(meal_data: Dict[str, Any]) -> Meal:
     """Create a meal object from AI response data"""
     
     # Extract gram/quantity information and round to 25g increments
     grams = meal_data.get("grams", meal_data.get("portions", 100))  # Fallback for old format
-    # Round to 25g increments
-    rounded_grams = round(float(grams) / 25) * 25
-    rounded_grams = max(25, rounded_grams)  # Minimum 25g
+    rounded_grams = _snap25([grams])[0]
     
     method = meal_data.get("method", "")
     meal_name = meal_data.get("name", "Unknown")
     
     # Find the actual meal from SAMPLE_MEALS to get correct price
-    actual_meal = None
-    for sample_meal in SAMPLE_MEALS:
-        if sample_meal.name.lower() == meal_name.lower():
-            actual_meal = sample_meal
-            break
+    actual_meal = _SAMPLE_INDEX.get(meal_name.lower())
     
+    # Pick the per-100g (calories, protein, carbs, fat, fiber, price) source, then scale once
     if actual_meal:
-        # Calculate correct price based on actual meal data and quantity
-        correct_price = (float(actual_meal.price) * rounded_grams / 100)
+        # Base meal nutrition and price
+        per_100g = (actual_meal.calories, actual_meal.protein, actual_meal.carbs,
+                    actual_meal.fat, actual_meal.fiber, float(actual_meal.price))
         
-        # Use actual meal nutrition or cooking method nutrition
-        if method and hasattr(actual_meal, 'cooking_methods') and actual_meal.cooking_methods:
+        # Use cooking method nutrition when the method is known
+        if method and actual_meal.cooking_methods:
             # Find the matching cooking method
             method_data = None
             for cook_method in actual_meal.cooking_methods:
@@ -353,37 +497,17 @@ def create_meal_from_response(meal_data: dict):
                     break
             
             if method_data:
-                # Use cooking method nutrition per 100g, calculate for actual grams
-                calories = method_data["calories"] * rounded_grams / 100
-                protein = method_data["protein"] * rounded_grams / 100
-                carbs = method_data["carbs"] * rounded_grams / 100
-                fat = method_data["fat"] * rounded_grams / 100
-                fiber = method_data.get("fiber", 0) * rounded_grams / 100
                 # Use cooking method price if available, otherwise base meal price
-                if "price" in method_data:
-                    correct_price = method_data["price"] * rounded_grams / 100
-            else:
-                # Fallback to base meal nutrition
-                calories = actual_meal.calories * rounded_grams / 100
-                protein = actual_meal.protein * rounded_grams / 100
-                carbs = actual_meal.carbs * rounded_grams / 100
-                fat = actual_meal.fat * rounded_grams / 100
-                fiber = getattr(actual_meal, 'fiber', 0) * rounded_grams / 100
-        else:
-            # Use base meal nutrition
-            calories = actual_meal.calories * rounded_grams / 100
-            protein = actual_meal.protein * rounded_grams / 100
-            carbs = actual_meal.carbs * rounded_grams / 100
-            fat = actual_meal.fat * rounded_grams / 100
-            fiber = getattr(actual_meal, 'fiber', 0) * rounded_grams / 100
+                per_100g = (method_data["calories"], method_data["protein"], method_data["carbs"],
+                            method_data["fat"], method_data["fiber"],
+                            method_data.get("price", per_100g[5]))
     else:
         # Fallback: use AI provided values if meal not found
-        calories = meal_data.get("calories", 0) * rounded_grams / 100
-        protein = meal_data.get("protein", 0) * rounded_grams / 100
-        carbs = meal_data.get("carbs", 0) * rounded_grams / 100
-        fat = meal_data.get("fat", 0) * rounded_grams / 100
-        fiber = meal_data.get("fiber", 0) * rounded_grams / 100
-        correct_price = meal_data.get("price", 0) * rounded_grams / 100
+        per_100g = (meal_data.get("calories", 0), meal_data.get("protein", 0), meal_data.get("carbs", 0),
+                    meal_data.get("fat", 0), meal_data.get("fiber", 0), meal_data.get("price", 0))
+    
+    scale = rounded_grams / 100
+    calories, protein, carbs, fat, fiber, correct_price = (value * scale for value in per_100g)
     
     # Create meal object with corrected data
     meal = Meal(
@@ -405,13 +529,12 @@ def create_meal_from_response(meal_data: dict):
             "fiber": fiber,
             "price": correct_price,
             "grams": rounded_grams
-        }] if method else []
+        }] if method else [],
+        # Additional attributes for frontend display
+        method=method,
+        quantity=rounded_grams  # Use rounded grams for all calculations
     )
     
-    # Add additional attributes for frontend display
-    meal.method = method
-    meal.quantity = rounded_grams  # Use rounded grams for all calculations
-    
     return meal
 
 def create_fallback_menu(user: User, budget: float, daily_calories: float) -> Menu:
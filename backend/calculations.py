@@ -1,4 +1,5 @@
-from backend.models import User, ActivityLevel
+from functools import lru_cache
+from backend.models import User, Gender, ActivityLevel, Goal
 
 def calculate_bmr(user: User) -> float:
     """Calculate Basal Metabolic Rate using Mifflin-St Jeor equation"""
@@ -8,15 +9,17 @@ def calculate_bmr(user: User) -> float:
         bmr = 10 * user.weight + 6.25 * user.height - 5 * user.age - 161
     return bmr
 
+# Activity multipliers applied to BMR
+_ACTIVITY_MULTIPLIERS = {
+    ActivityLevel.sedentary: 1.2,
+    ActivityLevel.light: 1.375,
+    ActivityLevel.moderate: 1.55,
+    ActivityLevel.active: 1.725
+}
+
 def calculate_tdee(user: User, bmr: float) -> float:
     """Calculate Total Daily Energy Expenditure"""
-    activity_multipliers = {
-        ActivityLevel.sedentary: 1.2,
-        ActivityLevel.light: 1.375,
-        ActivityLevel.moderate: 1.55,
-        ActivityLevel.active: 1.725
-    }
-    return bmr * activity_multipliers[user.activity]
+    return bmr * _ACTIVITY_MULTIPLIERS[user.activity]
 
 def get_daily_calories(user: User) -> float:
     """Get recommended daily calories based on goal"""
@@ -25,34 +28,31 @@ def get_daily_calories(user: User) -> float:
     
     return tdee
 
+@lru_cache(maxsize=4096)
+def _daily_calories(gender: Gender, age: int, height: float, weight: float,
+                    activity: ActivityLevel) -> float:
+    """Daily calories for the profile fields BMR/TDEE depend on, so repeat profiles skip the math"""
+    return get_daily_calories(User.model_construct(gender=gender, age=age, height=height,
+                                                   weight=weight, activity=activity))
+
 def calculate_daily_calories(user: User) -> float:
     """Calculate daily calorie needs based on user profile and goal"""
-    return get_daily_calories(user)
+    return _daily_calories(user.gender, user.age, user.height, user.weight, user.activity)
+
+# Share of daily calories per macro: (protein, carbs, fat, fiber)
+_MACRO_RATIOS = {
+    Goal.lose: (0.30, 0.30, 0.25, 0.15),      # Higher protein, lower carbs, higher fiber for satiety
+    Goal.gain: (0.25, 0.45, 0.25, 0.05),      # Higher carbs for muscle gain, lower fiber for easier digestion
+    Goal.maintain: (0.25, 0.40, 0.25, 0.10),  # Balanced for maintenance
+}
 
 def get_macro_targets(user: User, daily_calories: float) -> dict:
     """Calculate macro targets based on goal"""
-    if user.goal == "lose":
-        # Higher protein, lower carbs for weight loss
-        protein_ratio = 0.30
-        carb_ratio = 0.30
-        fat_ratio = 0.25
-        fiber_ratio = 0.15  # Higher fiber for weight loss (helps with satiety)
-    elif user.goal == "gain":
-        # Higher carbs for muscle gain
-        protein_ratio = 0.25
-        carb_ratio = 0.45
-        fat_ratio = 0.25
-        fiber_ratio = 0.05  # Lower fiber for muscle gain (easier digestion)
-    else:
-        # Balanced for maintenance
-        protein_ratio = 0.25
-        carb_ratio = 0.40
-        fat_ratio = 0.25
-        fiber_ratio = 0.10  # Moderate fiber for maintenance
+    protein_ratio, carb_ratio, fat_ratio, fiber_ratio = _MACRO_RATIOS.get(user.goal, _MACRO_RATIOS[Goal.maintain])
     
     return {
         "protein": (daily_calories * protein_ratio) / 4,  # 4 cal per gram
         "carbs": (daily_calories * carb_ratio) / 4,      # 4 cal per gram
         "fat": (daily_calories * fat_ratio) / 9,         # 9 cal per gram
         "fiber": (daily_calories * fiber_ratio) / 2      # 2 cal per gram
-    }
\ No newline at end of file
+    }
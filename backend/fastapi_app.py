@@ -1,43 +1,74 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+import hashlib
+import itertools
+import json
 import os
 
 from backend.models import (Meal, User, MealSelection, MealRecommendationRequest, 
-                          Recommendation, Menu, SAMPLE_MEALS, Gender, ActivityLevel, Goal)
+                          Recommendation, Menu, SAMPLE_MEALS, MEALS_BY_COMPONENT, GENDER_MAP, ACTIVITY_MAP, GOAL_MAP)
 from backend.calculations import calculate_daily_calories, get_macro_targets
-from backend.ai_service import get_meal_recommendation, get_optimized_menu
+from backend.ai_service import aget_meal_recommendation, aget_optimized_menu
+
+# English cooking method -> Vietnamese label
+_COOKING_TRANSLATIONS = {
+    'boiled': 'Luộc',
+    'steamed': 'Hấp', 
+    'raw': 'Sống/Tươi',
+    'baked': 'Nướng lò',
+    'grilled': 'Nướng',
+    'fried': 'Chiên',
+    'scrambled': 'Bác trứng',
+    'plain': 'Nguyên chất',
+    'spread': 'Phết',
+    'drizzled': 'Rưới',
+    'sautéed': 'Xào'
+}
 
 # Cooking method translation function
 def translate_cooking_method(method):
     """Translate English cooking methods to Vietnamese"""
-    translations = {
-        'boiled': 'Luộc',
-        'steamed': 'Hấp', 
-        'raw': 'Sống/Tươi',
-        'baked': 'Nướng lò',
-        'grilled': 'Nướng',
-        'fried': 'Chiên',
-        'scrambled': 'Bác trứng',
-        'plain': 'Nguyên chất',
-        'spread': 'Phết',
-        'drizzled': 'Rưới',
-        'sautéed': 'Xào'
-    }
-    return translations.get(method, method)
+    return _COOKING_TRANSLATIONS.get(method, method)
+
+def _method_meal(meal: Meal, method: dict) -> Meal:
+    """The catalog meal served with one cooking method (all values per 100g)"""
+    return Meal(
+        # Use Vietnamese name for cooking method
+        name=f"{meal.name} ({translate_cooking_method(method['method'])})",
+        calories=method["calories"],
+        protein=method["protein"],
+        carbs=method["carbs"],
+        fat=method["fat"],
+        fiber=method["fiber"],
+        price=method["price"],
+        component_type=meal.component_type,
+        food_type=meal.food_type,
+        cooking_methods=[method]
+    )
+
+# Lookups by meal name and by (meal name -> cooking method -> prepared Meal), built once from the
+# static catalog; Meal is frozen, so the prepared variants are shared across requests
+_MEAL_BY_NAME = {meal.name: meal for meal in SAMPLE_MEALS}
+_METHOD_MEALS = {meal.name: {method["method"]: _method_meal(meal, method) for method in meal.cooking_methods}
+                 for meal in SAMPLE_MEALS}
 
 app = FastAPI(title="Nutri AI API", description="AI-powered nutrition recommendation system")
 
-# Add CORS middleware
+# Add CORS middleware. The bundled frontend is same-origin; set CORS_ORIGINS (comma-separated)
+# to allow other frontends. Credentials are only allowed for an explicit origin list.
+cors_origins = [origin.strip() for origin in os.environ.get("CORS_ORIGINS", "*").split(",") if origin.strip()]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, specify actual origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=cors_origins,
+    allow_credentials="*" not in cors_origins,
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Content-Type"],
+    max_age=86400,  # let browsers cache preflight responses for a day
 )
 
 # Serve static files
@@ -45,6 +76,10 @@ static_path = os.path.join(os.path.dirname(__file__), "..", "static")
 if os.path.exists(static_path):
     app.mount("/static", StaticFiles(directory=static_path), name="static")
 
+# Resolved once at startup instead of joining and stat-ing on every request to /
+static_index = os.path.join(static_path, "index.html")
+has_static_index = os.path.exists(static_index)
+
 # Pydantic models for API requests/responses (only needed ones)
 class UserProfileRequest(BaseModel):
     name: str
@@ -63,11 +98,21 @@ class UserProfileResponse(BaseModel):
     fiber_target: float
     user: UserProfileRequest
 
+class DailyMealBlock(BaseModel):
+    meals: List[str] = []
+    quantities: List[float] = []  # grams, parallel to meals
+    methods: List[Optional[str]] = []  # cooking method per meal, empty/null for the base meal
+
+class DailyRecommendRequest(BaseModel):
+    user: UserProfileRequest
+    daily_meals: Dict[str, DailyMealBlock]  # breakfast, lunch, dinner
+
 class BudgetMenuRequest(BaseModel):
     user: UserProfileRequest
     budget: float
 
 class CartItem(BaseModel):
+    id: Optional[int] = None  # assigned by the server when the item is added
     name: str
     quantity: float  # in grams
     cooking_method: Optional[str] = None
@@ -87,27 +132,84 @@ class CartSummary(BaseModel):
     total_fiber: float
     total_cost: float
 
-# Global shopping cart storage (in production, use a database)
-shopping_cart = []
+def _make_user(name: str, age: int, gender: str, height: float, weight: float,
+               activity: str, goal: str) -> User:
+    """Build a User from already-validated request fields; only the enum fields need coercing"""
+    gender_value = GENDER_MAP.get(gender)
+    if gender_value is None:
+        raise ValueError(f"{gender!r} is not a valid Gender")
+    activity_value = ACTIVITY_MAP.get(activity)
+    if activity_value is None:
+        raise ValueError(f"{activity!r} is not a valid ActivityLevel")
+    goal_value = GOAL_MAP.get(goal)
+    if goal_value is None:
+        raise ValueError(f"{goal!r} is not a valid Goal")
+    return User.model_construct(
+        name=name,
+        age=age,
+        gender=gender_value,
+        height=height,
+        weight=weight,
+        activity=activity_value,
+        goal=goal_value
+    )
+
+def build_user(profile: UserProfileRequest) -> User:
+    """Build a User from a validated profile request"""
+    return _make_user(profile.name, profile.age, profile.gender, profile.height,
+                      profile.weight, profile.activity, profile.goal)
+
+@lru_cache(maxsize=4096)
+def _profile_targets(age: int, gender: str, height: float, weight: float,
+                     activity: str, goal: str) -> Tuple[float, float, float, float, float]:
+    """(daily calories, protein, carbs, fat, fiber) for a profile; invalid profiles raise and are not cached"""
+    user = _make_user("", age, gender, height, weight, activity, goal)
+    daily_calories = calculate_daily_calories(user)
+    macro_targets = get_macro_targets(user, daily_calories)
+    return (daily_calories, macro_targets["protein"], macro_targets["carbs"],
+            macro_targets["fat"], macro_targets["fiber"])
+
+# Global shopping cart storage keyed by item id, in insertion order (in production, use a database)
+shopping_cart: Dict[int, CartItem] = {}
+_cart_ids = itertools.count()
+
+# Running cart totals kept in step with shopping_cart, so reading the cart doesn't re-sum it
+_CART_TOTAL_FIELDS = ("calories", "protein", "carbs", "fat", "fiber", "price")
+cart_totals = dict.fromkeys(_CART_TOTAL_FIELDS, 0.0)
+
+def _reset_cart_totals():
+    for field in _CART_TOTAL_FIELDS:
+        cart_totals[field] = 0.0
+
+def _update_cart_totals(item: CartItem, sign: int):
+    """Add (sign=1) or subtract (sign=-1) an item's values from the running totals"""
+    if not shopping_cart:
+        # Start from exact zeros once the cart is empty so float drift doesn't accumulate
+        _reset_cart_totals()
+        return
+    for field in _CART_TOTAL_FIELDS:
+        cart_totals[field] += sign * getattr(item, field)
 
 # API Routes
 
 @app.get("/")
 async def root():
     """Serve the frontend"""
-    static_index = os.path.join(static_path, "index.html")
-    if os.path.exists(static_index):
+    if has_static_index:
         return FileResponse(static_index)
     return {"message": "Nutri AI API is running"}
 
+# Health probes get the same bytes every time, so the body is serialized once
+_HEALTH_RESPONSE_BODY = json.dumps({"status": "healthy", "message": "Nutri AI API is running"},
+                                   separators=(",", ":")).encode("utf-8")
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "message": "Nutri AI API is running"}
+    return Response(content=_HEALTH_RESPONSE_BODY, media_type="application/json")
 
-@app.get("/api/meals")
-async def get_meals():
-    """Get all available meals grouped by category with cooking methods"""
+def _meal_categories():
+    """Group SAMPLE_MEALS by category with cooking methods"""
     categories = {
         "carb": {"name": "🍚 Tinh bột", "meals": []},
         "protein": {"name": "🥩 Chất đạm", "meals": []},
@@ -115,151 +217,112 @@ async def get_meals():
         "fiber": {"name": "🥦 Chất xơ", "meals": []}
     }
 
-    for meal in SAMPLE_MEALS:
-        if meal.component_type in categories:
-            meal_dict = meal.model_dump()
-            # Include cooking methods for frontend selection
-            categories[meal.component_type]["meals"].append(meal_dict)
+    for component_type, data in categories.items():
+        # Include cooking methods for frontend selection
+        data["meals"] = [meal.model_dump() for meal in MEALS_BY_COMPONENT.get(component_type, ())]
 
-    return {"categories": categories}
+    return categories
+
+# SAMPLE_MEALS is static, so the /api/meals body is serialized once at import
+_MEALS_RESPONSE_BODY = json.dumps({"categories": _meal_categories()},
+                                  ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+# Clients revalidate with the ETag; it changes whenever the catalog does (i.e. on deploy)
+_MEALS_RESPONSE_HEADERS = {
+    "ETag": '"%s"' % hashlib.blake2b(_MEALS_RESPONSE_BODY, digest_size=8).hexdigest(),
+    "Cache-Control": "public, max-age=3600",
+}
+
+@app.get("/api/meals")
+async def get_meals(request: Request):
+    """Get all available meals grouped by category with cooking methods"""
+    if_none_match = request.headers.get("if-none-match", "")
+    if _MEALS_RESPONSE_HEADERS["ETag"] in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=_MEALS_RESPONSE_HEADERS)
+    return Response(content=_MEALS_RESPONSE_BODY, media_type="application/json", headers=_MEALS_RESPONSE_HEADERS)
 
 @app.post("/api/user/calculate", response_model=UserProfileResponse)
 async def calculate_user_profile(user_data: UserProfileRequest):
     """Calculate user's daily nutritional targets"""
     try:
-        # Create User object
-        user = User(
-            name=user_data.name,
-            age=user_data.age,
-            gender=Gender(user_data.gender),
-            height=user_data.height,
-            weight=user_data.weight,
-            activity=ActivityLevel(user_data.activity),
-            goal=Goal(user_data.goal)
+        # Targets depend only on the profile fields, so repeat profiles are a cache lookup
+        daily_calories, protein, carbs, fat, fiber = _profile_targets(
+            user_data.age, user_data.gender, user_data.height,
+            user_data.weight, user_data.activity, user_data.goal
         )
         
-        # Calculate targets
-        daily_calories = calculate_daily_calories(user)
-        macro_targets = get_macro_targets(user, daily_calories)
-        
-        return UserProfileResponse(
+        # Computed floats and the already-validated request need no second validation pass
+        return UserProfileResponse.model_construct(
             daily_calories=daily_calories,
-            protein_target=macro_targets["protein"],
-            carb_target=macro_targets["carbs"],
-            fat_target=macro_targets["fat"],
-            fiber_target=macro_targets["fiber"],
+            protein_target=protein,
+            carb_target=carbs,
+            fat_target=fat,
+            fiber_target=fiber,
             user=user_data
         )
     
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.post("/api/meals/recommend")
+@app.post("/api/meals/recommend", response_model=Recommendation)
 async def recommend_meals(request: MealRecommendationRequest):
     """Get AI recommendations for selected meals"""
     try:
-        # Create User object
-        user = User(
-            name=request.user.name,
-            age=request.user.age,
-            gender=Gender(request.user.gender),
-            height=request.user.height,
-            weight=request.user.weight,
-            activity=ActivityLevel(request.user.activity),
-            goal=Goal(request.user.goal)
-        )
+        # The request model already validated the user profile
+        user = request.user
         
         # Process selected meals
         meals = []
         quantities = []
         
-        for meal_data in request.selected_meals:
+        for selected_meal, quantity in zip(request.selection.meals, request.selection.quantities):
             # Find the meal in SAMPLE_MEALS
-            meal = next((m for m in SAMPLE_MEALS if m.name == meal_data["name"]), None)
+            meal = _MEAL_BY_NAME.get(selected_meal.name)
             if meal:
-                if meal_data.get("cooking_method"):
-                    # Create meal with specific cooking method
-                    method = next((m for m in meal.cooking_methods if m["method"] == meal_data["cooking_method"]), None)
-                    if method:
-                        processed_meal = Meal(
-                            name=f"{meal.name} ({translate_cooking_method(method['method'])})",
-                            calories=method["calories"],
-                            protein=method["protein"],
-                            carbs=method["carbs"],
-                            fat=method["fat"],
-                            fiber=method.get("fiber", 0),
-                            price=method["price"],
-                            component_type=meal.component_type,
-                            food_type=meal.food_type,
-                            cooking_methods=[method]
-                        )
-                        meals.append(processed_meal)
-                else:
+                if selected_meal.method:
+                    # Meal with specific cooking method
+                    meal = _METHOD_MEALS[meal.name].get(selected_meal.method)
+                if meal:
                     meals.append(meal)
-                
-                quantities.append(meal_data["quantity"])
+                    quantities.append(quantity)
         
         # Get AI recommendation
         selection = MealSelection(meals=meals, quantities=quantities)
-        recommendation = get_meal_recommendation(user, selection)
+        recommendation = await aget_meal_recommendation(user, selection)
         
-        return recommendation.model_dump()
+        return recommendation
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/daily/recommend")
-async def recommend_daily_meals(request: dict):
+@app.post("/api/daily/recommend", response_model=Recommendation)
+async def recommend_daily_meals(request: DailyRecommendRequest):
     """Get AI recommendations for complete daily meal plan"""
     try:
-        user_data = request["user"]
-        daily_meals = request["daily_meals"]  # breakfast, lunch, dinner structure
+        daily_meals = request.daily_meals  # breakfast, lunch, dinner structure
         
-        # Create User object
-        user = User(
-            name=user_data["name"],
-            age=user_data["age"],
-            gender=Gender(user_data["gender"]),
-            height=user_data["height"],
-            weight=user_data["weight"],
-            activity=ActivityLevel(user_data["activity"]),
-            goal=Goal(user_data["goal"])
-        )
+        user = build_user(request.user)
         
         # Process all daily meals
         all_meals = []
         all_quantities = []
         
         for meal_time in ["breakfast", "lunch", "dinner"]:
-            if meal_time in daily_meals and daily_meals[meal_time]["meals"]:
-                meals_data = daily_meals[meal_time]["meals"]
-                quantities_data = daily_meals[meal_time]["quantities"]
-                methods_data = daily_meals[meal_time]["methods"]
+            block = daily_meals.get(meal_time)
+            if block and block.meals:
+                meals_data = block.meals
+                quantities_data = block.quantities
+                methods_data = block.methods
                 
                 for i, meal_name in enumerate(meals_data):
-                    meal = next((m for m in SAMPLE_MEALS if m.name == meal_name), None)
+                    meal = _MEAL_BY_NAME.get(meal_name)
                     if meal:
                         quantity = quantities_data[i] if i < len(quantities_data) else 100
                         method = methods_data[i] if i < len(methods_data) and methods_data[i] else None
                         
                         if method:
-                            # Create meal with specific cooking method (all values per 100g)
-                            method_data = next((m for m in meal.cooking_methods if m["method"] == method), None)
-                            if method_data:
-                                # Use Vietnamese name for cooking method
-                                vietnamese_method = translate_cooking_method(method_data['method'])
-                                processed_meal = Meal(
-                                    name=f"{meal.name} ({vietnamese_method})",
-                                    calories=method_data["calories"],
-                                    protein=method_data["protein"],
-                                    carbs=method_data["carbs"],
-                                    fat=method_data["fat"],
-                                    fiber=method_data.get("fiber", 0),  # Add fiber field with default
-                                    price=method_data["price"],
-                                    component_type=meal.component_type,
-                                    food_type=meal.food_type,
-                                    cooking_methods=[method_data]
-                                )
+                            # Meal with specific cooking method (all values per 100g)
+                            processed_meal = _METHOD_MEALS[meal.name].get(method)
+                            if processed_meal:
                                 all_meals.append(processed_meal)
                                 all_quantities.append(quantity)  # Use grams for all meals
                             else:
@@ -273,33 +336,24 @@ async def recommend_daily_meals(request: dict):
         # Get AI recommendation for full day
         if all_meals:
             selection = MealSelection(meals=all_meals, quantities=all_quantities)
-            recommendation = get_meal_recommendation(user, selection)
-            return recommendation.model_dump()
+            recommendation = await aget_meal_recommendation(user, selection)
+            return recommendation
         else:
-            return {"error": "No meals selected"}
+            return JSONResponse({"error": "No meals selected"})
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/budget/optimize")
+@app.post("/api/budget/optimize", response_model=Menu)
 async def optimize_budget_menu(request: BudgetMenuRequest):
     """Get optimized menu within budget"""
     try:
-        # Create User object
-        user = User(
-            name=request.user.name,
-            age=request.user.age,
-            gender=Gender(request.user.gender),
-            height=request.user.height,
-            weight=request.user.weight,
-            activity=ActivityLevel(request.user.activity),
-            goal=Goal(request.user.goal)
-        )
+        user = build_user(request.user)
         
         # Get optimized menu
-        menu = get_optimized_menu(user, request.budget)
+        menu = await aget_optimized_menu(user, request.budget)
         
-        return menu.model_dump()
+        return menu
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -307,22 +361,14 @@ async def optimize_budget_menu(request: BudgetMenuRequest):
 @app.get("/api/cart")
 async def get_cart():
     """Get current shopping cart contents"""
-    # Calculate totals
-    total_calories = sum(item.calories for item in shopping_cart)
-    total_protein = sum(item.protein for item in shopping_cart)
-    total_carbs = sum(item.carbs for item in shopping_cart)
-    total_fat = sum(item.fat for item in shopping_cart)
-    total_fiber = sum(item.fiber for item in shopping_cart)
-    total_cost = sum(item.price for item in shopping_cart)
-    
     cart_summary = CartSummary(
-        items=shopping_cart,
-        total_calories=total_calories,
-        total_protein=total_protein,
-        total_carbs=total_carbs,
-        total_fat=total_fat,
-        total_fiber=total_fiber,
-        total_cost=total_cost
+        items=list(shopping_cart.values()),
+        total_calories=cart_totals["calories"],
+        total_protein=cart_totals["protein"],
+        total_carbs=cart_totals["carbs"],
+        total_fat=cart_totals["fat"],
+        total_fiber=cart_totals["fiber"],
+        total_cost=cart_totals["price"]
     )
     
     return cart_summary.model_dump()
@@ -334,20 +380,24 @@ async def add_to_cart(item: CartItem):
     if item.cooking_method:
         item.cooking_method = translate_cooking_method(item.cooking_method)
     
-    shopping_cart.append(item)
-    return {"message": "Item added to cart", "cart_size": len(shopping_cart)}
+    item.id = next(_cart_ids)
+    shopping_cart[item.id] = item
+    _update_cart_totals(item, 1)
+    return {"message": "Item added to cart", "cart_size": len(shopping_cart), "item_id": item.id}
 
 @app.delete("/api/cart/clear")
 async def clear_cart():
     """Clear all items from the shopping cart"""
     shopping_cart.clear()
+    _reset_cart_totals()
     return {"message": "Cart cleared", "cart_size": 0}
 
-@app.delete("/api/cart/item/{item_index}")
-async def remove_cart_item(item_index: int):
-    """Remove a specific item from the cart by index"""
-    if 0 <= item_index < len(shopping_cart):
-        removed_item = shopping_cart.pop(item_index)
+@app.delete("/api/cart/item/{item_id}")
+async def remove_cart_item(item_id: int):
+    """Remove a specific item from the cart by id"""
+    if item_id in shopping_cart:
+        removed_item = shopping_cart.pop(item_id)
+        _update_cart_totals(removed_item, -1)
         return {"message": f"Removed {removed_item.name} from cart", "cart_size": len(shopping_cart)}
     else:
         raise HTTPException(status_code=404, detail="Item not found in cart")
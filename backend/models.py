@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, ConfigDict, field_validator
+from functools import cached_property
+from typing import Optional, List, Dict, Any, Tuple
 from enum import Enum
 
 class Gender(str, Enum):
@@ -17,7 +18,15 @@ class Goal(str, Enum):
     maintain = "maintain"
     gain = "gain"
 
+# Value -> member lookups, so request strings are coerced with a dict lookup instead of Enum(value)
+GENDER_MAP = {member.value: member for member in Gender}
+ACTIVITY_MAP = {member.value: member for member in ActivityLevel}
+GOAL_MAP = {member.value: member for member in Goal}
+
 class User(BaseModel):
+    # Profiles are never modified after validation; frozen also makes them hashable
+    model_config = ConfigDict(frozen=True)
+
     name: str
     age: int
     gender: Gender
@@ -27,12 +36,15 @@ class User(BaseModel):
     goal: Goal
 
 class Meal(BaseModel):
+    # Catalog and response meals are shared between requests, so they must not be modified
+    model_config = ConfigDict(frozen=True)
+
     name: str
     calories: float
     protein: float  # g
     carbs: float  # g
     fat: float  # g
-    fiber: float  # g
+    fiber: float = 0.0  # g
     price: float  # VND
     component_type: str  # carb, protein, good_fat, fiber
     food_type: str  # specific type within component (e.g., grains, poultry, etc.)
@@ -41,6 +53,39 @@ class Meal(BaseModel):
     method: Optional[str] = None
     quantity: Optional[float] = None
 
+    @field_validator("cooking_methods")
+    @classmethod
+    def _default_method_fiber(cls, cooking_methods: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Fiber is optional in a cooking method; fill it in once here so readers can index it directly
+        normalized = []
+        for method in cooking_methods:
+            method = dict(method)
+            method.setdefault("fiber", 0.0)
+            normalized.append(method)
+        return normalized
+
+    @cached_property
+    def nutrition_per_100g(self) -> Tuple[float, float, float, float, float, float]:
+        # (calories, protein, carbs, fat, fiber, price) per 100g, from the first cooking method if any
+        if self.cooking_methods:
+            method_data = self.cooking_methods[0]
+            return (
+                float(method_data["calories"]),
+                float(method_data["protein"]),
+                float(method_data["carbs"]),
+                float(method_data["fat"]),
+                float(method_data["fiber"]),
+                float(self.price),
+            )
+        return (
+            float(self.calories),
+            float(self.protein),
+            float(self.carbs),
+            float(self.fat),
+            float(self.fiber),
+            float(self.price),
+        )
+
 class MealSelection(BaseModel):
     meals: List[Meal]
     quantities: List[float]  # grams
@@ -50,6 +95,9 @@ class MealRecommendationRequest(BaseModel):
     selection: MealSelection
 
 class Recommendation(BaseModel):
+    # Built once per request and only read afterwards
+    model_config = ConfigDict(frozen=True)
+
     adjusted_meals: List[Meal]
     adjusted_quantities: List[float]
     total_calories: float
@@ -61,6 +109,9 @@ class Recommendation(BaseModel):
     explanation: str
 
 class Menu(BaseModel):
+    # Built once per request and only read afterwards
+    model_config = ConfigDict(frozen=True)
+
     breakfast: List[Meal]
     lunch: List[Meal]
     dinner: List[Meal]
@@ -68,8 +119,8 @@ class Menu(BaseModel):
     total_calories: float
     explanation: str
 
-# Sample meals data organized by categories
-SAMPLE_MEALS = [
+# Sample meals data organized by categories; read-only reference data, so a tuple
+SAMPLE_MEALS = (
     # Carbs
     Meal(name="Gạo lứt", calories=130, protein=2.7, carbs=27, fat=1, fiber=2.8, price=2500, component_type="carb", food_type="grains",
          cooking_methods=[
@@ -149,4 +200,10 @@ SAMPLE_MEALS = [
          cooking_methods=[
              {"method": "raw", "calories": 95, "protein": 0.5, "carbs": 25.1, "fat": 0.3, "fiber": 4.4, "price": 5000}
          ]),
-]
\ No newline at end of file
+)
+
+# Catalog grouped by component_type (in SAMPLE_MEALS order) so category views don't rescan it
+MEALS_BY_COMPONENT = {
+    component_type: tuple(meal for meal in SAMPLE_MEALS if meal.component_type == component_type)
+    for component_type in dict.fromkeys(meal.component_type for meal in SAMPLE_MEALS)
+}
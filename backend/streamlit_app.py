@@ -1,7 +1,7 @@
 import streamlit as st
-from backend.models import User, Meal, MealSelection, SAMPLE_MEALS, Gender, ActivityLevel, Goal
+from backend.models import User, Meal, MealSelection, MEALS_BY_COMPONENT, Gender, ActivityLevel, Goal
 from backend.calculations import calculate_daily_calories, get_macro_targets
-from backend.ai_service import get_meal_recommendation, get_optimized_menu
+# backend.ai_service (and google-genai) is imported where an AI call is made, so pages without one load faster
 
 # Configure page
 st.set_page_config(
@@ -50,6 +50,27 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Meals grouped by category; the catalog is static, so this is built once rather than on every rerun
+MEAL_CATEGORIES = {
+    "carb": {"name": "🍚 Carbs", "meals": MEALS_BY_COMPONENT.get("carb", ())},
+    "protein": {"name": "🥩 Protein", "meals": MEALS_BY_COMPONENT.get("protein", ())},
+    "good_fat": {"name": "🥜 Good Fats", "meals": MEALS_BY_COMPONENT.get("good_fat", ())},
+    "fiber": {"name": "🥦 Fiber", "meals": MEALS_BY_COMPONENT.get("fiber", ())}
+}
+
+def meal_widget_keys(meal_key, meal):
+    """Checkbox, cooking-method and quantity widget keys for a meal at one meal time"""
+    checkbox_key = f"{meal_key}_{meal.name.replace(' ', '_')}"
+    return checkbox_key, f"method_{checkbox_key}", f"qty_{checkbox_key}"
+
+# Widget keys per (meal time, meal name), formatted once instead of on every rerun
+MEAL_WIDGET_KEYS = {
+    (meal_key, meal.name): meal_widget_keys(meal_key, meal)
+    for meal_key in ("breakfast", "lunch", "dinner")
+    for data in MEAL_CATEGORIES.values()
+    for meal in data["meals"]
+}
+
 def main():
     st.markdown('<h1 class="main-header">🥗 Nutri AI - Complete Version</h1>', unsafe_allow_html=True)
     st.markdown('<p style="text-align: center; font-size: 1.2rem; color: #666;">AI-powered healthy food recommendation system</p>', unsafe_allow_html=True)
@@ -61,6 +82,8 @@ def main():
         st.session_state.meal_selection = []
     if "recommendation" not in st.session_state:
         st.session_state.recommendation = None
+    if "recommendation_quantities" not in st.session_state:
+        st.session_state.recommendation_quantities = []
     if "budget_menu" not in st.session_state:
         st.session_state.budget_menu = None
 
@@ -165,6 +188,8 @@ def show_user_profile():
             st.success("✅ Profile saved successfully!")
             st.rerun()
 
+# Widget changes on this page rerun only this page, not the whole app (header, CSS, sidebar)
+@st.fragment
 def show_meal_selection():
     st.header("🍽️ Meal Selection & AI Recommendations")
     
@@ -180,17 +205,7 @@ def show_meal_selection():
             "dinner": {"meals": [], "quantities": [], "methods": []}
         }
 
-    # Group meals by category
-    categories = {
-        "carb": {"name": "🍚 Carbs", "meals": []},
-        "protein": {"name": "🥩 Protein", "meals": []},
-        "good_fat": {"name": "🥜 Good Fats", "meals": []},
-        "fiber": {"name": "🥦 Fiber", "meals": []}
-    }
-
-    for meal in SAMPLE_MEALS:
-        if meal.component_type in categories:
-            categories[meal.component_type]["meals"].append(meal)
+    categories = MEAL_CATEGORIES
 
     # Meal time selection
     meal_times = ["🌅 Breakfast", "☀️ Lunch", "🌙 Dinner"]
@@ -209,8 +224,8 @@ def show_meal_selection():
                 st.markdown(f"**{data['name']}**")
                 
                 for meal in data["meals"]:
-                    # Create a unique key for each meal and meal time
-                    meal_checkbox_key = f"{meal_key}_{meal.name.replace(' ', '_')}"
+                    # Unique keys for each meal and meal time
+                    meal_checkbox_key, method_key, qty_key = MEAL_WIDGET_KEYS[meal_key, meal.name]
                     
                     if st.checkbox(f"{meal.name}", key=meal_checkbox_key):
                         col1, col2, col3 = st.columns([2, 1, 1])
@@ -218,13 +233,13 @@ def show_meal_selection():
                         with col1:
                             # Cooking method selection
                             if meal.cooking_methods:
-                                method_options = [f"{method['method']} - {method['portion']}" 
+                                method_options = [f"{method['method']} - {method['calories']} cal/100g"
                                                 for method in meal.cooking_methods]
                                 selected_method_idx = st.selectbox(
                                     "Cooking Method",
                                     range(len(method_options)),
-                                    format_func=lambda x: method_options[x],
-                                    key=f"method_{meal_checkbox_key}"
+                                    format_func=method_options.__getitem__,
+                                    key=method_key
                                 )
                                 selected_method = meal.cooking_methods[selected_method_idx]
                                 temp_methods.append(selected_method)
@@ -240,7 +255,7 @@ def show_meal_selection():
                                     max_value=10.0, 
                                     value=1.0, 
                                     step=0.1,
-                                    key=f"qty_{meal_checkbox_key}"
+                                    key=qty_key
                                 )
                             else:
                                 qty = st.number_input(
@@ -248,7 +263,7 @@ def show_meal_selection():
                                     min_value=10, 
                                     max_value=1000, 
                                     value=100,
-                                    key=f"qty_{meal_checkbox_key}"
+                                    key=qty_key
                                 )
                             temp_quantities.append(qty)
                         
@@ -385,6 +400,8 @@ def show_meal_selection():
         # Get AI recommendation for the full day
         if st.button("🤖 Get AI Recommendation for Full Day", type="primary"):
             with st.spinner("Getting AI recommendation for your daily meal plan..."):
+                from backend.ai_service import get_meal_recommendation
+
                 # Create meal objects with cooking method data
                 processed_meals = []
                 processed_quantities = []
@@ -398,21 +415,25 @@ def show_meal_selection():
                             protein=method["protein"],
                             carbs=method["carbs"],
                             fat=method["fat"],
+                            fiber=method["fiber"],
                             price=method["price"],
                             component_type=meal.component_type,
                             food_type=meal.food_type,
                             cooking_methods=[method]
                         )
                         processed_meals.append(meal_obj)
-                        processed_quantities.append(qty)
+                        # "Portions" are of the per-100g method values; the AI works in grams
+                        processed_quantities.append(qty * 100)
                     else:
-                        # Legacy data
+                        # Legacy data, already entered in grams
                         processed_meals.append(meal)
                         processed_quantities.append(qty)
 
                 selection = MealSelection(meals=processed_meals, quantities=processed_quantities)
                 recommendation = get_meal_recommendation(user, selection)
                 st.session_state.recommendation = recommendation
+                # Grams the recommendation was asked for, to show how the AI adjusted them
+                st.session_state.recommendation_quantities = processed_quantities
                 st.success("✅ AI recommendations generated for your full day!")
                 st.rerun()
     
@@ -442,6 +463,8 @@ def show_budget_menu():
         
         if st.form_submit_button("🎯 Generate Optimized Menu", type="primary"):
             with st.spinner("Creating your optimized menu..."):
+                from backend.ai_service import get_optimized_menu
+
                 menu = get_optimized_menu(user, budget)
                 st.session_state.budget_menu = menu
                 st.success("✅ Optimized menu created!")
@@ -540,7 +563,8 @@ def show_results():
             # Show adjusted portions
             if len(rec.adjusted_meals) > 0:
                 st.subheader("🔧 Portion Adjustments")
-                for i, (meal, old_qty, new_qty) in enumerate(zip(rec.adjusted_meals, [1]*len(rec.adjusted_meals), rec.adjusted_quantities)):
+                for meal, old_qty, new_qty in zip(rec.adjusted_meals, st.session_state.recommendation_quantities,
+                                                  rec.adjusted_quantities):
                     if abs(new_qty - old_qty) > 0.1:  # Only show significant changes
                         change = ((new_qty - old_qty) / old_qty) * 100 if old_qty > 0 else 0
                         direction = "📈" if change > 0 else "📉"
@@ -0,0 +1,171 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.ai_service as ai_service
+import backend.fastapi_app as fastapi_app
+from backend.fastapi_app import app
+from backend.models import SAMPLE_MEALS, Recommendation
+
+client = TestClient(app)
+
+PROFILE = {"name": "A", "age": 25, "gender": "male", "height": 170, "weight": 70,
+           "activity": "moderate", "goal": "maintain"}
+
+CATALOG = {meal.name: meal for meal in SAMPLE_MEALS}
+
+
+def cart_item(name, **values):
+    item = {"name": name, "quantity": 100, "calories": 0, "protein": 0, "carbs": 0,
+            "fat": 0, "fiber": 0, "price": 0}
+    item.update(values)
+    return item
+
+
+@pytest.fixture(autouse=True)
+def empty_cart():
+    client.delete("/api/cart/clear")
+    yield
+    client.delete("/api/cart/clear")
+
+
+def test_remove_cart_item_by_id():
+    first = client.post("/api/cart/add", json=cart_item("Ức gà", calories=248, protein=46.5, price=20000))
+    second = client.post("/api/cart/add", json=cart_item("Gạo lứt", calories=216, carbs=45, fiber=4.6, price=4000))
+    first_id, second_id = first.json()["item_id"], second.json()["item_id"]
+    assert first_id != second_id
+
+    response = client.delete(f"/api/cart/item/{first_id}")
+    assert response.status_code == 200
+    assert response.json()["cart_size"] == 1
+
+    cart = client.get("/api/cart").json()
+    assert [(item["id"], item["name"]) for item in cart["items"]] == [(second_id, "Gạo lứt")]
+    assert cart["total_calories"] == pytest.approx(216)
+    assert cart["total_protein"] == pytest.approx(0)
+    assert cart["total_carbs"] == pytest.approx(45)
+    assert cart["total_fiber"] == pytest.approx(4.6)
+    assert cart["total_cost"] == pytest.approx(4000)
+
+    # Ids are not positions: the removed id stays gone
+    assert client.delete(f"/api/cart/item/{first_id}").status_code == 404
+
+
+def test_meals_etag_returns_304_when_unchanged():
+    response = client.get("/api/meals")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "public, max-age=3600"
+    assert set(response.json()["categories"]) == {"carb", "protein", "good_fat", "fiber"}
+
+    cached = client.get("/api/meals", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    weak = client.get("/api/meals", headers={"If-None-Match": f'"stale", W/{etag}'})
+    assert weak.status_code == 304
+
+    stale = client.get("/api/meals", headers={"If-None-Match": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.content == response.content
+
+
+@pytest.fixture
+def no_gemini(monkeypatch):
+    """Make every Gemini call fail, so recommendations use the local scaling fallback"""
+    def unavailable():
+        raise ValueError("Gemini disabled in tests")
+    monkeypatch.setattr(ai_service, "_get_client", unavailable)
+
+
+def selected(name, method=None):
+    return dict(CATALOG[name].model_dump(), method=method)
+
+
+def test_recommend_meals_resolves_selection_against_catalog(no_gemini):
+    response = client.post("/api/meals/recommend", json={
+        "user": PROFILE,
+        "selection": {
+            "meals": [selected("Ức gà", "grilled"), selected("Yến mạch", "steamed"), selected("Gạo lứt")],
+            "quantities": [150, 80, 200],
+        },
+    })
+    assert response.status_code == 200
+    recommendation = response.json()
+
+    # The unknown method drops Yến mạch together with its quantity
+    assert [meal["name"] for meal in recommendation["adjusted_meals"]] == ["Ức gà (Nướng)", "Gạo lứt"]
+    quantities = recommendation["adjusted_quantities"]
+    assert len(quantities) == 2
+
+    # Totals only add up if each quantity is paired with its own meal
+    grilled_calories = CATALOG["Ức gà"].cooking_methods[0]["calories"]
+    base_calories = CATALOG["Gạo lứt"].nutrition_per_100g[0]
+    expected = (grilled_calories * quantities[0] + base_calories * quantities[1]) / 100
+    assert recommendation["total_calories"] == pytest.approx(expected)
+
+
+@pytest.fixture
+def captured_selection(monkeypatch):
+    """Replace the AI call with one that echoes the selection the route built"""
+    captured = {}
+
+    async def echo_recommendation(user, selection):
+        captured["selection"] = selection
+        return Recommendation(
+            adjusted_meals=selection.meals, adjusted_quantities=selection.quantities,
+            total_calories=0, total_protein=0, total_carbs=0, total_fat=0, total_fiber=0,
+            total_cost=0, explanation="echo")
+
+    monkeypatch.setattr(fastapi_app, "aget_meal_recommendation", echo_recommendation)
+    return captured
+
+
+def test_daily_recommend_rejects_malformed_body():
+    # The frontend sends null when a quantity input is cleared
+    response = client.post("/api/daily/recommend", json={
+        "user": PROFILE,
+        "daily_meals": {"breakfast": {"meals": ["Ức gà"], "quantities": [None], "methods": ["grilled"]}},
+    })
+    assert response.status_code == 422
+
+
+def test_daily_recommend_defaults_short_lists(captured_selection):
+    response = client.post("/api/daily/recommend", json={
+        "user": PROFILE,
+        "daily_meals": {
+            # Lunch is missing entirely; dinner has no meals
+            "breakfast": {"meals": ["Ức gà", "Gạo lứt"], "quantities": [200], "methods": ["grilled"]},
+            "dinner": {"meals": ["Táo"]},
+        },
+    })
+    assert response.status_code == 200
+    selection = captured_selection["selection"]
+    # Missing quantities default to 100g and missing methods to the base meal
+    assert [meal.name for meal in selection.meals] == ["Ức gà (Nướng)", "Gạo lứt", "Táo"]
+    assert selection.quantities == [200, 100, 100]
+    assert response.json()["adjusted_quantities"] == [200, 100, 100]
+
+
+def test_daily_recommend_without_meals(captured_selection):
+    response = client.post("/api/daily/recommend", json={
+        "user": PROFILE,
+        "daily_meals": {"breakfast": {"meals": [], "quantities": [], "methods": []}, "lunch": {}},
+    })
+    assert response.status_code == 200
+    assert response.json() == {"error": "No meals selected"}
+    assert "selection" not in captured_selection
+
+
+@pytest.mark.parametrize("field, value, detail", [
+    ("gender", "x", "'x' is not a valid Gender"),
+    ("activity", "y", "'y' is not a valid ActivityLevel"),
+    ("goal", "z", "'z' is not a valid Goal"),
+])
+def test_calculate_profile_rejects_invalid_enum(field, value, detail):
+    profile = dict(PROFILE, **{field: value})
+    # Repeated on purpose: a failed profile must not be cached by _profile_targets
+    for _ in range(2):
+        response = client.post("/api/user/calculate", json=profile)
+        assert response.status_code == 400
+        assert response.json()["detail"] == detail